@@ -1,31 +1,50 @@
 import pandas as pd
 
 
-def assignzero(df: pd.DataFrame, score: str):
+def assignzero(df: pd.DataFrame, id: str, code: str, score: str) -> pd.Series:
+    """Find the less severe forms of comorbidities where the more severe form is present.
+
+    Args:
+        df (pd.DataFrame): Long dataframe with one row per `id` and comorbidity in `code`.
+        id (str): Name of column with unique identifier.
+        code (str): Name of column with comorbidities.
+        score (str): Name of mapping used, e.g. "charlson_icd10_quan".
+
+    Returns:
+        pd.Series: Boolean mask aligned to `df` that is True for rows superseded by a more severe comorbidity.
+    """
     if "charlson" in score:
-        # "Mild liver disease" (`mld`) and "Moderate/severe liver disease" (`msld`)
-        # x[msld == 1, mld := 0]
-        df.mld = df.mld.where(df.msld == 0, 0)
-
-        # "Diabetes" (`diab`) and "Diabetes with complications" (`diabwc`)
-        # x[diabwc == 1, diab := 0]
-        df.diab = df.diab.where(df.diabwc == 0, 0)
-
-        # "Cancer" (`canc`) and "Metastatic solid tumour" (`metacanc`)
-        # x[metacanc == 1, canc := 0]
-        df.canc = df.canc.where(df.metacanc == 0, 0)
+        pairs = [
+            # "Mild liver disease" (`mld`) and "Moderate/severe liver disease" (`msld`)
+            # x[msld == 1, mld := 0]
+            ("mld", "msld"),
+            # "Diabetes" (`diab`) and "Diabetes with complications" (`diabwc`)
+            # x[diabwc == 1, diab := 0]
+            ("diab", "diabwc"),
+            # "Cancer" (`canc`) and "Metastatic solid tumour" (`metacanc`)
+            # x[metacanc == 1, canc := 0]
+            ("canc", "metacanc"),
+        ]
 
     elif "elixhauser" in score:
-        # "Hypertension, uncomplicated" (`hypunc`) and "Hypertension, complicated" (`hypc`)
-        # x[hypc == 1, hypunc := 0]
-        df.hypunc = df.hypunc.where(df.hypc == 0, 0)
-
-        # "Diabetes, uncomplicated" (`diabunc`) and "Diabetes, complicated" (`diabc`)
-        # x[diabc == 1, diabunc := 0]
-        df.diabunc = df.diabunc.where(df.diabc == 0, 0)
-
-        # "Solid tumour" (`solidtum`) and "Metastatic cancer" (`metacanc`)
-        # x[metacanc == 1, solidtum := 0]
-        df.solidtum = df.solidtum.where(df.metacanc == 0, 0)
-
-    return df
+        pairs = [
+            # "Hypertension, uncomplicated" (`hypunc`) and "Hypertension, complicated" (`hypc`)
+            # x[hypc == 1, hypunc := 0]
+            ("hypunc", "hypc"),
+            # "Diabetes, uncomplicated" (`diabunc`) and "Diabetes, complicated" (`diabc`)
+            # x[diabc == 1, diabunc := 0]
+            ("diabunc", "diabc"),
+            # "Solid tumour" (`solidtum`) and "Metastatic cancer" (`metacanc`)
+            # x[metacanc == 1, solidtum := 0]
+            ("solidtum", "metacanc"),
+        ]
+
+    else:
+        pairs = []
+
+    superseded = pd.Series(False, index=df.index)
+    for less_severe, more_severe in pairs:
+        more_severe_ids = df.loc[df[code] == more_severe, id]
+        superseded |= (df[code] == less_severe) & df[id].isin(more_severe_ids)
+
+    return superseded
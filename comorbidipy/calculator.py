@@ -1,55 +1,105 @@
 """Main module."""
-import warnings
 from functools import lru_cache
+import numpy as np
 import pandas as pd
-try:
-    # for newer versions of pandas
-    from pandas.errors import SettingWithCopyWarning
-except:
-    # for older versions of pandas
-    from pandas.core.common import SettingWithCopyWarning
 
-warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
-
-import math
 from .mapping import mapping, hfrs_mapping, impairments
 from .weights import weights
 from .assignzero import assignzero
 from .colnames import get_colnames
 
 
-def _calculate_weighted_score(
-    dfp: pd.DataFrame, param_score: str, assign0: bool, weighting: str
-):
+def _get_prefixes(param_score: str) -> dict:
+    if param_score == "impairments":
+        return impairments
+    return mapping[param_score]
+
+
+@lru_cache(maxsize=None)
+def _build_prefix_tables(param_score: str):
+    """Build lookup tables of the ICD prefixes for a mapping, one per prefix length.
 
-    # Create a copy of the supplied dataframe first
-    df = dfp.copy()
+    Each table maps a prefix to the rank of its label, i.e. its position in the mapping.
+    When a code matches prefixes of more than one label, the label with the highest
+    rank wins, i.e. the last matching label in the mapping.
+
+    Returns:
+        tuple: Index of labels and a dict of prefix length to pd.Series of ranks.
+    """
+    prefixes = _get_prefixes(param_score)
+    ranks = dict()
+    for rank, label in enumerate(prefixes):
+        for prefix in prefixes[label]:
+            ranks[prefix] = rank
+
+    tables = dict()
+    for prefix, rank in ranks.items():
+        tables.setdefault(len(prefix), dict())[prefix] = rank
+
+    return pd.Index(list(prefixes)), {
+        length: pd.Series(tables[length]) for length in sorted(tables)
+    }
 
-    # if assign0 is True, set the less severe of the comorbidities to 0
-    # this does not change the values in the actual columns but only affects the weighting
+
+def _reverse_mapping(codes, param_score: str) -> pd.Series:
+    """Map unique ICD codes to labels. Codes without a matching prefix are left out.
+
+    Each code is truncated to every prefix length in the mapping and looked up in
+    the corresponding table, so the work is vectorised over all codes at once.
+    """
+    labels, tables = _build_prefix_tables(param_score)
+    codes = pd.Series(codes, dtype=object)
+    codes = codes[codes.map(type) == str]
+
+    best = np.full(len(codes), -1.0)
+    for length, table in tables.items():
+        rank = codes.str.slice(0, length).map(table)
+        best = np.fmax(best, rank.to_numpy(dtype=float))
+
+    matched = best >= 0
+    return pd.Series(
+        labels[best[matched].astype(int)], index=codes[matched].to_numpy()
+    )
+
+
+def _calculate_weighted_score(
+    df: pd.DataFrame,
+    id: str,
+    code: str,
+    param_score: str,
+    assign0: bool,
+    weighting: str,
+) -> pd.Series:
+
+    # Weight each comorbidity directly in the long dataframe
+    # Map the raw values, as mapping a categorical returns a categorical
+    # whenever the weights of its categories are all different
+    w = df[code].astype(object).map(weights[param_score][weighting])
+
+    # if assign0 is True, set the weight of the less severe of the comorbidities to 0
+    # this does not change the values in the pivoted columns but only affects the weighting
     # e.g the final dataset will still have true for both diabetes and diabetes with complications
     # but only diabetes with complications will be used for calculating the final score.
     if assign0:
-        df = assignzero(df, param_score)
+        w = w.mask(assignzero(df, id, code, param_score), 0)
 
-    # Get the weights into a pandas series
-    w = weights[param_score][weighting]
-    w = pd.Series(w)
+    comorbidity_score = w.groupby(df[id], sort=False, observed=True).sum()
 
-    dfp["comorbidity_score"] = df.multiply(w).sum(axis=1)
     # if sum of weights is less than zero, set it zero (this only applies to UK SHMI)
-    dfp["comorbidity_score"] = dfp["comorbidity_score"].where(
-        dfp["comorbidity_score"] >= 0, 0
-    )
-    return dfp
+    return comorbidity_score.where(comorbidity_score >= 0, 0).astype(float)
 
 
-def _age_adjust(dfp: pd.DataFrame, age: str):
+def _age_adjust(comorbidity_score: np.ndarray, ages: np.ndarray) -> np.ndarray:
 
-    age_score = dfp[age].subtract(40).floordiv(10).apply(lambda x: min(max(0, x), 4))
-    dfp["age_adj_comorbidity_score"] = dfp["comorbidity_score"] + age_score
+    # 1 point for every decade over 40 upto a maximum of 4 points. Missing ages score 0.
+    age_score = np.clip((ages - 40) // 10, 0, 4)
+    age_score = np.nan_to_num(age_score, nan=0).astype(np.int8)
+
+    return comorbidity_score + age_score
 
-    return dfp
+
+def _survival_10yr(age_adj_comorbidity_score: np.ndarray) -> np.ndarray:
+    return np.power(0.983, np.exp(0.9 * age_adj_comorbidity_score))
 
 
 def comorbidity(
@@ -98,12 +148,11 @@ def comorbidity(
 
     df = df.dropna(subset=[id, code])
 
-    if age:
-        if age not in df.columns:
-            raise KeyError(f"Column age was assigned {age} but not found")
-        dfid = df[[id, age]].drop_duplicates(subset=[id])
-    else:
-        dfid = df[[id]].drop_duplicates()
+    if age and age not in df.columns:
+        raise KeyError(f"Column age was assigned {age} but not found")
+
+    # One row per id, indexed by id, with the first age seen for each id
+    dfid = df[[id, age] if age else [id]].drop_duplicates(subset=[id]).set_index(id)
 
     score_icd_variant = f"{score}_{icd}_{variant}"
 
@@ -113,49 +162,61 @@ def comorbidity(
             f"Allowed score_icd_variant combinations are {list(mapping)}"
         )
 
-    reverse_mapping = {
-        i: k
-        for i in df[code].unique()
-        for k, v in mapping[score_icd_variant].items()
-        if i.startswith(tuple(v))
-    }
-
-    # Keep only codes that are in mapping
-    df[code] = df[code].where(df[code].isin(reverse_mapping), other=None)
-
-    df = df.dropna(subset=[code]).drop_duplicates(subset=[id, code])
+    colnames = get_colnames(score)
+    reverse_mapping = _reverse_mapping(df[code].unique(), score_icd_variant)
+
+    # Keep only codes that are in mapping and replace them with mapping
+    # The comorbidities are a small fixed set, so store them as a categorical
+    df = df.loc[df[code].isin(reverse_mapping.index), [id, code]]
+    df = df.assign(
+        **{
+            code: df[code]
+            .map(reverse_mapping)
+            .astype(pd.CategoricalDtype(categories=list(colnames)))
+        }
+    )
 
-    # Replace codes with mapping
-    df[code] = df[code].replace(reverse_mapping)
-    # The following is needed as multiple codes may map to same comorbidity
+    # Multiple codes may map to same comorbidity
     # If there are duplicates, pivot will fail
     df = df.drop_duplicates(subset=[id, code])
 
-    # Pivot
-    df["tmp"] = 1
-    dfp = df.pivot(index=id, columns=code, values="tmp").fillna(0)
+    # Pivot into int8 indicators
+    dfp = (
+        df.assign(tmp=np.int8(1))
+        .pivot(index=id, columns=code, values="tmp")
+        .fillna(0)
+        .astype(np.int8)
+    )
 
+    # Put the columns in a fixed order regardless of the order of the rows.
     # If a particular comorbidity does not occur at all in the dataset,
     # create a column and assign 0
-    colnames = get_colnames(score)
-    for c in colnames:
-        if c not in dfp.columns:
-            dfp[c] = 0
+    dfp = dfp.reindex(columns=list(colnames), fill_value=0).astype(np.int8)
 
     # Calculate weighted score
-    dfp = _calculate_weighted_score(dfp, score_icd_variant, assign0, weighting)
+    dfp["comorbidity_score"] = _calculate_weighted_score(
+        df, id, code, score_icd_variant, assign0, weighting
+    )
 
-    # Merge back into dfid, adjusting for age and calculating survival if needed
+    # Align to the original list of ids. Ids without any comorbidities get 0.
+    dfp = dfp.reindex(dfid.index, fill_value=0)
+
+    # Adjust for age and calculate survival if needed, using numpy arrays
+    # rather than reading intermediate results back from dataframe columns
     if age:
-        dfp = dfid.merge(dfp, on=id, how="left").fillna(0)
-        dfp = _age_adjust(dfp, age)
+        # Missing ages are returned as 0
+        dfp.insert(0, age, dfid[age].fillna(0).to_numpy())
+
+        age_adj_comorbidity_score = _age_adjust(
+            dfp["comorbidity_score"].to_numpy(),
+            dfid[age].to_numpy(dtype=float, na_value=np.nan),
+        )
+        dfp["age_adj_comorbidity_score"] = age_adj_comorbidity_score
 
         if score == "charlson" and weighting == "charlson":
-            dfp[f"survival_10yr"] = dfp[f"age_adj_comorbidity_score"].apply(
-                lambda x: 0.983 ** math.exp(0.9 * x)
-            )
-    else:
-        dfp = dfid.merge(dfp, on=id, how="left").fillna(0)
+            dfp["survival_10yr"] = _survival_10yr(age_adj_comorbidity_score)
+
+    dfp = dfp.rename_axis(columns=None).reset_index()
 
     # Add metadata to dataframe before returning.
     # Helps when calling this function with different parameters and
@@ -171,7 +232,63 @@ def comorbidity(
     return dfp
 
 
-def hfrs(df: pd.DataFrame, id: str = "id", code: str = "code"):
+def _hfrs_polars(df: pd.DataFrame, id: str, code: str) -> pd.DataFrame:
+    try:
+        import polars as pl
+    except ImportError as e:
+        raise ImportError(
+            "engine='polars' requires polars and pyarrow. "
+            "Install them with `pip install comorbidipy[polars]`."
+        ) from e
+
+    codes = df[code]
+
+    # Polars cannot convert an object column with mixed types. Only then replace
+    # the codes that are not strings, which never match a weight.
+    if pd.api.types.infer_dtype(codes, skipna=True).startswith("mixed"):
+        uniques = pd.Series(codes.dropna().unique(), dtype=object)
+        strings = uniques[uniques.map(type) == str]
+        codes = codes.where(codes.isin(strings) | codes.isna(), "")
+
+    # Keep only id, code columns and drop missing
+    pl_df = pl.from_pandas(pd.DataFrame({id: df[id], code: codes})).drop_nulls()
+
+    ids = pl_df.select(id).unique(maintain_order=True)
+
+    hfrs_weights = pl.DataFrame(
+        {"hfrs_code": list(hfrs_mapping), "hfrs": list(hfrs_mapping.values())}
+    )
+
+    # Normalise each unique code to its first 3 characters in upper case
+    # and keep only those in hfrs_mapping
+    code_weights = (
+        pl_df.select(pl.col(code).unique())
+        .with_columns(
+            hfrs_code=pl.col(code)
+            .cast(pl.Utf8, strict=False)
+            .str.strip_chars_start()
+            .str.slice(0, 3)
+            .str.to_uppercase()
+        )
+        .join(hfrs_weights, on="hfrs_code", how="inner")
+    )
+
+    # Different raw codes may normalise to the same code
+    hfrs_score = (
+        pl_df.join(code_weights, on=code, how="inner")
+        .unique(subset=[id, "hfrs_code"])
+        .group_by(id)
+        .agg(pl.col("hfrs").sum())
+    )
+
+    # Align to the original list of ids. Fill missing values with 0.
+    return (
+        ids.join(hfrs_score, on=id, how="left", maintain_order="left")
+        .with_columns(pl.col("hfrs").fill_null(0.0))
+        .to_pandas()
+    )
+
+def hfrs(df: pd.DataFrame, id: str = "id", code: str = "code", engine: str = "pandas"):
     """Calculate Hospital Frailty Risk Score
 
     This is only applicable to patients who are 75 years or older.
@@ -182,37 +299,61 @@ def hfrs(df: pd.DataFrame, id: str = "id", code: str = "code"):
         df (pd.DataFrame): Dataframe with 2 columns named `id` and `code`
         id (str, optional): Name of column to use as `id`. Defaults to "id".
         code (str, optional): Name of column to use as `code`. Defaults to "code".
+        engine (str, optional): One of "pandas", "polars". The polars engine is multi-threaded and
+            requires the optional polars dependencies (`pip install comorbidipy[polars]`). Defaults to "pandas".
+
+    Raises:
+        KeyError: Raised if `id` or `code` are not in `df.columns`.
+        ValueError: Raised if `engine` is not one of "pandas", "polars".
 
     Return:
         pd.DataFrame: Dataframe with `id` and `hfrs` values.
     """
 
-    @lru_cache(maxsize=65536)
-    def _mapper(x: str):
-        try:
-            x = x.lstrip()[0:3].upper()
-            return x if x in hfrs_mapping else None
-        except:
-            return None
-
     if id not in df.columns or code not in df.columns:
         raise KeyError(f"Missing column(s). Ensure column(s) {id}, {code} are present.")
 
+    if engine == "polars":
+        return _hfrs_polars(df, id, code)
+    elif engine != "pandas":
+        raise ValueError(f"Unknown engine {engine}. Allowed engines are pandas, polars.")
+
     # Keep only id, code columns and drop missing and duplicates first
     df = df[[id, code]].dropna().drop_duplicates()
 
-    dfid = df[[id]].drop_duplicates()
-
-    df[code] = df[code].apply(_mapper)
+    ids = pd.Index(df[id].unique(), name=id)
+
+    # Normalise each unique code to its first 3 characters in upper case
+    # and keep only those in hfrs_mapping. Codes that are not strings never match.
+    codes = pd.Series(df[code].unique(), dtype=object)
+    codes = codes[codes.map(type) == str]
+    normalised = codes.str.lstrip().str.slice(0, 3).str.upper()
+    keep = normalised.isin(list(hfrs_mapping))
+    normalised = pd.Series(normalised[keep].to_numpy(), index=codes[keep].to_numpy())
+
+    df = df.loc[df[code].isin(normalised.index)]
+    df = df.assign(
+        **{
+            code: df[code]
+            .map(normalised)
+            .astype(pd.CategoricalDtype(categories=list(hfrs_mapping)))
+        }
+    )
 
-    # Drop missing and duplicates. This should leave only codes in hfrs_mapping
-    df = df.dropna().drop_duplicates()
+    # Different raw codes may normalise to the same code
+    df = df.drop_duplicates()
 
-    df["hfrs"] = df[code].replace(hfrs_mapping)
-    df = df.groupby(id)["hfrs"].sum().reset_index()
+    # Rows are aligned to ids below, so group keys need not be sorted
+    hfrs_score = (
+        df[code]
+        .map(hfrs_mapping)
+        .rename("hfrs")
+        .groupby(df[id], sort=False, observed=True)
+        .sum()
+    )
 
-    # Merge back into original list of ids. Fill missing values with 0.
-    df = dfid.merge(df, on=id, how="left").fillna(0)
+    # Align to the original list of ids. Fill missing values with 0.
+    df = hfrs_score.reindex(ids, fill_value=0).reset_index()
 
     return df
 
@@ -237,29 +378,37 @@ def disability(df: pd.DataFrame, id: str = "id", code: str = "code") -> pd.DataF
 
     df = df.dropna(subset=[id, code])
 
-    dfid = df[[id]].drop_duplicates()
-
-    icd = df[code].unique()
-
-    reverse_mapping = {
-        i: k for i in icd for k, v in impairments.items() if i.startswith(tuple(v))
-    }
+    ids = pd.Index(df[id].unique(), name=id)
 
-    # Keep only codes that are in mapping
-    df[code] = df[code].where(df[code].isin(reverse_mapping.keys()), other=None)
+    reverse_mapping = _reverse_mapping(df[code].unique(), "impairments")
 
-    df = df.dropna(subset=[code]).drop_duplicates(subset=[id, code])
+    # Keep only codes that are in mapping and replace them with mapping
+    df = df.loc[df[code].isin(reverse_mapping.index), [id, code]]
+    df = df.assign(
+        **{
+            code: df[code]
+            .map(reverse_mapping)
+            .astype(pd.CategoricalDtype(categories=list(impairments)))
+        }
+    )
 
-    # Replace codes with mapping
-    df[code] = df[code].replace(reverse_mapping)
-    # not sure if this is needed but if there are duplicates,  pivot will fail
+    # Multiple codes may map to same comorbidity
+    # If there are duplicates, pivot will fail
     df = df.drop_duplicates(subset=[id, code])
-    df["tmp"] = 1
 
     # Pivot
-    df = df.pivot(index=id, columns=code, values="tmp")
+    df = (
+        df.assign(tmp=np.int8(1))
+        .pivot(index=id, columns=code, values="tmp")
+        .fillna(0)
+        .astype(np.int8)
+    )
+
+    # Put the observed impairments in a fixed order regardless of the order of the rows
+    df = df.reindex(columns=sorted(df.columns))
 
-    # Merge back into original list of ids. Fill missing values with 0.
-    df = dfid.merge(df, on=id, how="left").fillna(0)
+    # Align to the original list of ids. Fill missing values with 0.
+    df = df.reindex(ids, fill_value=0)
+    df = df.rename_axis(columns=None).reset_index()
 
     return df
@@ -3,46 +3,75 @@
 """Tests for `comorbidipy` package."""
 
 
-import random
+import importlib.util
 import unittest
-from itertools import cycle
+import warnings
+from functools import lru_cache
+from unittest import mock
 
+import numpy as np
 import pandas as pd
 
-from comorbidipy import comorbidity, mapping
+from comorbidipy import comorbidity, disability, get_colnames, hfrs, mapping
+from comorbidipy.calculator import _reverse_mapping
+from comorbidipy.weights import weights
+
+
+@lru_cache(maxsize=None)
+def _num_of_patients(mapping_key: str) -> int:
+    """Largest number of codes for any comorbidity in a mapping."""
+    return max(len(v) for v in mapping.mapping[mapping_key].values())
+
 
 def generate_synthetic_icd10_data(
     score: str = "charlson",
     icd: str = "icd10",
     variant: str = "shmi",
     weighting: str = None,  # for compatibility
+    seed: int = None,
 ):
 
     mapping_key = f"{score}_{icd}_{variant}"
-    patients = []
-
-    num_of_patients = max(map(len, mapping.mapping[mapping_key].values()))
-    codes = [cycle(random.sample(v, len(v))) for v in mapping.mapping[mapping_key].values()]
-
-    for n in range(num_of_patients):
-
-        age = random.randint(0, 100)
-
-        for c in codes:
-
-            patients.append({"id": n, "age": age, "code": next(c)})
-
-    df = pd.DataFrame.from_records(patients)
+    rng = np.random.default_rng(seed)
+    buckets = list(mapping.mapping[mapping_key].values())
+
+    num_of_patients = _num_of_patients(mapping_key)
+    num_of_codes = len(buckets)
+
+    patients = np.arange(num_of_patients)
+
+    # One column per comorbidity, each cycling through its shuffled codes
+    columns = []
+    for v in buckets:
+        shuffled = rng.choice(np.asarray(v), size=len(v), replace=False)
+        columns.append(shuffled[patients % shuffled.size])
+    codes = np.column_stack(columns)
+
+    ages = rng.integers(0, 101, size=num_of_patients)
+
+    df = pd.DataFrame(
+        {
+            "id": np.repeat(patients, num_of_codes),
+            "age": np.repeat(ages, num_of_codes),
+            "code": codes.ravel(),
+        }
+    )
+
+    # Codes come from a small fixed vocabulary, ids and ages are small integers
+    df["code"] = pd.Categorical(df["code"])
+    df["id"] = df["id"].astype(np.int32)
+    df["age"] = df["age"].astype(np.int8)
     return df
 
 
 class TestComorbidipy(unittest.TestCase):
     """Tests for `comorbidipy` package."""
 
-    def setUp(self):
-        """Set up test fixtures, if any."""
+    @classmethod
+    def setUpClass(cls):
+        """Set up test fixtures shared by all tests in the class."""
 
-        self.test_args = [
+        cls.test_args = [
             {
                 "args": {
                     "icd": "icd10",
@@ -66,12 +95,12 @@ class TestComorbidipy(unittest.TestCase):
                     "icd": "icd10",
                     "score": "charlson",
                     "variant": "quan",
-                    "weighting": "quan",cd str
+                    "weighting": "quan",
                 },
                 "max_ccs": 22,
             },
         ]
-        self.number_of_runs = 20
+        cls.number_of_runs = 3
 
     def tearDown(self):
         """Tear down test fixtures, if any."""
@@ -87,10 +116,14 @@ class TestComorbidipy(unittest.TestCase):
 
             for i in range(self.number_of_runs):
 
-                df = generate_synthetic_icd10_data(**kwargs)
-                ccs = comorbidity(df, **kwargs)
+                with self.subTest(seed=i, **kwargs):
 
-                self.assertTrue(all(ccs["comorbidity_score"] == max_ccs))
+                    df = generate_synthetic_icd10_data(seed=i, **kwargs)
+                    ccs = comorbidity(df, **kwargs)
+
+                    self.assertTrue(
+                        (ccs["comorbidity_score"].to_numpy() == max_ccs).all()
+                    )
                 
 class TestSpecifics(unittest.TestCase):
 
@@ -110,15 +143,9 @@ class TestSpecifics(unittest.TestCase):
 
         """
 
-        df = pd.DataFrame({'id': [1,1,1,1], 
-                           'age':[60,60,60,60],
-                           'code': ['B20','E120','E117','N18']})
-
-        ccs = comorbidity(df, icd="icd10", score="charlson", variant="shmi", weighting="shmi")
-
-        score = ccs["comorbidity_score"][0]
-
-        self.assertTrue(score == 11)
+        df1 = pd.DataFrame({'id': [1,1,1,1], 
+                            'age':[60,60,60,60],
+                            'code': ['B20','E120','E117','N18']})
 
         """
         Create another example with a known value.
@@ -134,16 +161,10 @@ class TestSpecifics(unittest.TestCase):
 
         """
 
-        df = pd.DataFrame({'id': [1,1,1,1,1,1], 
+        df2 = pd.DataFrame({'id': [2,2,2,2,2,2], 
                     'age':[60,60,60,60,60,60],
                     'code': ['K721','K767','K74','K702','J60','C18']})
 
-        ccs = comorbidity(df, icd="icd10", score="charlson", variant="shmi", weighting="shmi")
-
-        score = ccs["comorbidity_score"][0]
-
-        self.assertTrue(score == 30)
-
         """
         Create a final example with a known value.
         
@@ -159,15 +180,219 @@ class TestSpecifics(unittest.TestCase):
 
         """
 
-        df = pd.DataFrame({'id': [1,1,1,1,1], 
+        df3 = pd.DataFrame({'id': [3,3,3,3,3], 
                     'age':[60,60,60,60,60],
                     'code': ['C25','C79','K27','G820','M32']})
 
+        # Score all three examples in a single call, one id per example
+        df = pd.concat([df1, df2, df3], ignore_index=True)
+
         ccs = comorbidity(df, icd="icd10", score="charlson", variant="shmi", weighting="shmi")
 
-        score = ccs["comorbidity_score"][0]
+        scores = ccs.set_index("id")["comorbidity_score"].loc[[1, 2, 3]].tolist()
+
+        self.assertEqual(scores, [11, 30, 28])
+
+    def test_distinct_weights(self):
+
+        """
+        A weighting where every comorbidity has a different weight.
+
+        K74 (mld) is superseded by K721 (msld), so only the weight of msld counts.
+
+        """
+
+        distinct = {c: i + 1 for i, c in enumerate(get_colnames("charlson"))}
+
+        df = pd.DataFrame({'id': [1,1], 'age': [60,60], 'code': ['K74','K721']})
+
+        with mock.patch.dict(weights["charlson_icd10_quan"], {"distinct": distinct}):
+            ccs = comorbidity(df, weighting="distinct")
+
+        self.assertEqual(ccs["comorbidity_score"].tolist(), [distinct["msld"]])
+
+    def test_column_order(self):
+
+        """
+        The order of the output columns should not depend on the order of the rows.
+        """
+
+        df = pd.DataFrame({'id': [1,1,2,2,3],
+                           'age':[50,50,60,60,70],
+                           'code': ['N18','I21','C18','R54','F803']})
+
+        ccs = comorbidity(df)
+        ccs_reversed = comorbidity(df[::-1])
+
+        self.assertEqual(list(ccs.columns), list(ccs_reversed.columns))
+        self.assertEqual(list(ccs.columns)[2:-2], list(get_colnames("charlson")))
+        self.assertTrue((ccs[list(get_colnames("charlson"))].dtypes == np.int8).all())
+
+        dis = disability(df)
+        dis_reversed = disability(df[::-1])
+
+        self.assertEqual(list(dis.columns), ["id", "frail", "impaired_speech"])
+        self.assertEqual(list(dis.columns), list(dis_reversed.columns))
+
+    def test_categorical_id(self):
+
+        """
+        Unused id categories are not scored and pandas does not warn about `observed`.
+        """
+
+        df = pd.DataFrame({'id': pd.Categorical([1,2], categories=[1,2,3]),
+                           'age':[50,60],
+                           'code': ['N18','I50']})
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", FutureWarning)
+            ccs = comorbidity(df)
+
+        self.assertEqual(ccs["id"].tolist(), [1, 2])
+        self.assertEqual(ccs["comorbidity_score"].tolist(), [1, 2])
+
+    def test_missing_age(self):
+
+        """
+        Missing ages are returned as 0 and scored as 0. Scores are floats.
+        """
+
+        df = pd.DataFrame({'id': [1,2],
+                           'age':[np.nan,60],
+                           'code': ['I21','N18']})
+
+        ccs = comorbidity(df)
+
+        self.assertEqual(ccs["age"].tolist(), [0, 60])
+        self.assertEqual(ccs["comorbidity_score"].dtype, np.float64)
+        self.assertEqual(ccs["age_adj_comorbidity_score"].tolist(), [0, 3])
+
+    def test_prefix_precedence(self):
+
+        """
+        Where a code matches prefixes of more than one comorbidity, the last
+        matching comorbidity in the mapping wins, as in the original lookup.
+
+        e.g. I110 matches chf (I110) and hypc (I11) in elixhauser_icd10_quan.
+        """
+
+        for key, m in {**mapping.mapping, "impairments": mapping.impairments}.items():
+            with self.subTest(score=key):
+                prefixes = sorted({p for v in m.values() for p in v})
+                codes = prefixes + [p + "9" for p in prefixes]
+
+                expected = {
+                    i: k for i in codes for k, v in m.items() if i.startswith(tuple(v))
+                }
+
+                self.assertEqual(_reverse_mapping(codes, key).to_dict(), expected)
+
+        reverse_mapping = _reverse_mapping(["I110", "I120", "I278", "I426"],
+                                           "elixhauser_icd10_quan")
+        self.assertEqual(reverse_mapping.tolist(), ["hypc", "rf", "cpd", "alcohol"])
+
+    def test_non_string_codes(self):
+
+        """
+        Codes that are not strings match no comorbidity. The patient is kept with a score of 0.
+        """
+
+        df = pd.DataFrame({'id': [1,2,2],
+                           'age':[60,70,70],
+                           'code': [250, 'N18', 5.0]})
+
+        ccs = comorbidity(df)
+
+        self.assertEqual(ccs["id"].tolist(), [1, 2])
+        self.assertEqual(ccs["comorbidity_score"].tolist(), [0, 1])
+
+        dis = disability(df.assign(code=[250, 'R54', 5.0]))
+
+        self.assertEqual(dis.to_dict("list"), {"id": [1, 2], "frail": [0, 1]})
+
+        # No string codes at all
+        df = df.assign(code=[250, 401, 5])
+
+        ccs = comorbidity(df)
+
+        self.assertEqual(ccs["id"].tolist(), [1, 2])
+        self.assertEqual(ccs["comorbidity_score"].tolist(), [0, 0])
+
+        self.assertEqual(disability(df).to_dict("list"), {"id": [1, 2]})
+
+
+class TestDisability(unittest.TestCase):
+
+    def test_disability(self):
+
+        df = pd.DataFrame({'id': [1,1,1,2,3,4],
+                           'code': ['R54','H540','F70','H911',np.nan,'I21']})
+
+        dis = disability(df)
+
+        expected = pd.DataFrame({'id': [1,2,4],
+                                 'frail': [1,0,0],
+                                 'impaired_hearing': [0,1,0],
+                                 'impaired_vision': [1,0,0],
+                                 'ld_asd': [1,0,0]})
+
+        pd.testing.assert_frame_equal(dis, expected, check_dtype=False)
+
+    def test_missing_columns(self):
+
+        df = pd.DataFrame({'id': [1], 'icd10': ['R54']})
+
+        with self.assertRaises(KeyError):
+            disability(df)
+
+
+class TestHfrs(unittest.TestCase):
+
+    def setUp(self):
+
+        self.df = pd.DataFrame({'id': [1,1,1,2,2,3,3],
+                                'code': [' f00','F001','W19','I21','R54','F05',np.nan]})
+
+    def test_unknown_engine(self):
+
+        with self.assertRaises(ValueError):
+            hfrs(self.df, engine="spark")
+
+    def test_numeric_codes(self):
+
+        """
+        Codes that are all numeric match nothing and every id scores 0.
+        """
+
+        df = pd.DataFrame({'id': [1,2], 'code': [250,401]})
+
+        pd.testing.assert_frame_equal(
+            hfrs(df), pd.DataFrame({'id': [1,2], 'hfrs': [0.0,0.0]})
+        )
+
+    @unittest.skipUnless(importlib.util.find_spec("polars"), "polars is not installed")
+    def test_polars_engine(self):
+
+        """
+        The polars engine should give the same result as the pandas engine
+        for object, categorical and mixed-type code columns.
+        """
 
-        self.assertTrue(score == 28)
+        code_columns = {
+            "object": self.df["code"],
+            "categorical": self.df["code"].astype("category"),
+            "mixed": self.df["code"].where(self.df["id"] != 2, 5).astype(object),
+            "numeric": pd.Series(range(len(self.df))),
+        }
+
+        for name, codes in code_columns.items():
+            with self.subTest(code=name):
+                df = self.df.assign(code=codes)
+                pd.testing.assert_frame_equal(
+                    hfrs(df, engine="polars"),
+                    hfrs(df),
+                    check_dtype=False,
+                )
 
 
 if __name__ == "__main__":